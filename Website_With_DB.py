@@ -212,6 +212,7 @@ print("=" * 60 + "\n")
 # Optional: allow disabling sync at startup in production multi-worker deployments
 SYNC_ON_START = os.getenv("NIRIX_SYNC_ON_START", "true").lower() in ("1", "true", "yes")
 VALIDATE_ON_START = os.getenv("NIRIX_VALIDATE_ON_START", "true").lower() in ("1", "true", "yes")
+DEBUG_MODE = os.getenv("NIRIX_DEBUG", "false").lower() == "true"
 
 if SYNC_ON_START:
     try:
@@ -220,7 +221,7 @@ if SYNC_ON_START:
         print(f"[STARTUP] Test sync complete: {sync_result}")
     except Exception as e:
         print(f"[STARTUP] Warning: Test sync failed: {e}")
-        if os.getenv("NIRIX_DEBUG", "false").lower() == "true":
+        if DEBUG_MODE:
             traceback.print_exc()
 else:
     print("[STARTUP] Sync disabled (NIRIX_SYNC_ON_START=false)")
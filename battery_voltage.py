@@ -30,17 +30,62 @@ FIXES:
 from __future__ import annotations
 
 import time
+import socket
+import struct
 import logging
-from typing import Dict, Any, Optional, Generator
+import selectors
+import threading
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, Generator, NamedTuple
 
 import can
 from can import BusABC  # FIXED: Added missing import
 
-# FIX: Do not import from can_utils. This prevents ImportError crashes on load.
-# from diagnostics.can_utils import open_can_bus, close_can_bus
+# FIX: can_utils is optional. A failed import must not crash the module on
+# load, so fall back to a private bus opened by _open_bus.
+try:
+    from diagnostics.can_utils import get_or_open_can_bus, release_can_bus, shared_bus_lock
+except Exception:
+    get_or_open_can_bus = None
+    release_can_bus = None
+    shared_bus_lock = None
 
 logging.getLogger("can").setLevel(logging.ERROR)
 
+logger = logging.getLogger(__name__)
+
+
+def _log_info(message: str):
+    logger.info(f"[BATTERY] {message}")
+
+
+def _log_warn(message: str):
+    logger.warning(f"[BATTERY] {message}")
+
+
+def _log_error(message: str):
+    logger.error(f"[BATTERY] {message}")
+
+
+def _log_debug(message: str):
+    logger.debug(f"[BATTERY] {message}")
+
+
+REQUEST_ID = 0x7F0
+RESPONSE_ID = 0x7F1
+RESPONSE_TIMEOUT = 2.0   # seconds to wait for the ECU reply
+FRAME_TIMEOUT = 0.3      # max single wait (bounds cancel latency)
+READ_INTERVAL = 0.4      # stream pacing between reads
+
+# Only the ECU response is of interest (standard 11-bit ID)
+_RX_FILTERS = [{"can_id": RESPONSE_ID, "can_mask": 0x7FF, "extended": False}]
+
+# SocketCAN raw frame: can_id (u32), can_dlc (u8), 3 pad bytes, data[8]
+_CAN_FRAME = struct.Struct("=IB3x8s")
+
+# Byte -> "XX" lookup for the serialized data list (log lines use bytes.hex)
+_HEX = tuple(f"{b:02X}" for b in range(256))
+
 
 def _open_bus(can_interface: str, bitrate: int) -> Optional[can.Bus]:
     """
@@ -50,97 +95,322 @@ def _open_bus(can_interface: str, bitrate: int) -> Optional[can.Bus]:
     iface = (can_interface or "").strip()
     try:
         if iface.upper().startswith("PCAN"):
-            return can.Bus(interface="pcan", channel=iface, bitrate=int(bitrate), fd=False)
-        if iface.lower().startswith("can"):
-            return can.Bus(interface="socketcan", channel=iface, bitrate=int(bitrate))
-        raise ValueError(f"Unsupported CAN interface: {iface}")
+            bus = can.Bus(interface="pcan", channel=iface, bitrate=int(bitrate), fd=False)
+        elif iface.lower().startswith("can"):
+            bus = can.Bus(interface="socketcan", channel=iface, bitrate=int(bitrate))
+        else:
+            raise ValueError(f"Unsupported CAN interface: {iface}")
     except Exception as e:
-        print(f"[BATTERY] Failed to open CAN bus: {e}")
+        _log_error(f"Failed to open CAN bus: {e}")
+        return None
+
+    # SocketCAN installs this as a CAN_RAW_FILTER so other traffic never
+    # reaches userspace; PCAN gets python-can's filtering inside bus.recv().
+    try:
+        bus.set_filters(_RX_FILTERS)
+    except Exception as e:
+        _log_error(f"Could not set CAN filter: {e}")
+        try:
+            bus.shutdown()
+        except Exception:
+            pass
+        return None
+    return bus
+
+
+def _acquire_bus(can_interface: str, bitrate: int) -> Optional[can.Bus]:
+    """
+    Take the channel's shared bus from the can_utils pool so several stream
+    programs don't each pay driver init (PCAN also allows only one Bus per
+    channel). Falls back to a private bus when can_utils is unavailable.
+    Release with _release_bus().
+    """
+    iface = (can_interface or "").strip()
+    if iface.upper().startswith("PCAN"):
+        backend = "pcan"
+    elif iface.lower().startswith("can"):
+        backend = "socketcan"
+    else:
+        backend = None
+
+    if get_or_open_can_bus is not None and backend:
+        try:
+            return get_or_open_can_bus(
+                channel=iface, bitrate=int(bitrate), backend=backend, filters=_RX_FILTERS
+            )
+        except Exception as e:
+            _log_warn(f"Shared CAN bus unavailable, opening a private one: {e}")
+    return _open_bus(can_interface, bitrate)
+
+
+def _release_bus(bus: BusABC) -> None:
+    """Counterpart of _acquire_bus(): drop the pool reference or shut down."""
+    if release_can_bus is not None:
+        release_can_bus(bus, _RX_FILTERS)
+    else:
+        bus.shutdown()
+
+
+def _make_selector(bus: BusABC) -> Optional[selectors.BaseSelector]:
+    """
+    Register the SocketCAN fd for kernel readiness notification.
+    Returns None for backends without a raw socket (PCAN) -> bus.recv() path.
+    """
+    sock = getattr(bus, "socket", None)
+    if sock is None:
+        return None
+    try:
+        sel = selectors.DefaultSelector()
+        sel.register(sock, selectors.EVENT_READ)
+        return sel
+    except Exception:
         return None
 
 
+def _drain_rx(bus: BusABC, selector, max_frames: int = 64) -> None:
+    """
+    Discard frames already queued (late replies from a previous request)
+    without blocking, so the next wait only sees the fresh response.
+    """
+    try:
+        for _ in range(max_frames):
+            if selector is None:
+                if bus.recv(timeout=0) is None:
+                    return
+            else:
+                if not selector.select(timeout=0):
+                    return
+                bus.socket.recv(_CAN_FRAME.size, socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        pass  # another user of the shared socket took it: queue is empty
+    except Exception:
+        pass
+
+
+def _recv_response(bus: BusABC, selector, deadline: float, context=None) -> Optional[can.Message]:
+    """
+    Wait for the ECU response frame until `deadline` (time.monotonic() based).
+
+    SocketCAN: select() on the fd and read raw 16-byte frames without
+    blocking. On a pooled bus another reader can take the frame between the
+    select() and the recv(); that is treated as "no frame yet".
+    Other backends: plain bus.recv() polling.
+    The bus filter keeps most other traffic out, but a shared bus also
+    passes frames its other users asked for, so the ID is still checked.
+
+    The caller checkpoints before sending; here context.checkpoint() only
+    runs after a wait slice that returned nothing, so a prompt reply costs
+    no checkpoint while a silent ECU stays cancellable within FRAME_TIMEOUT.
+    """
+    has_ctx = context is not None
+    idle = False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if idle and has_ctx:
+            context.checkpoint()
+
+        try:
+            if selector is None:
+                msg = bus.recv(timeout=min(FRAME_TIMEOUT, remaining))
+                idle = msg is None
+                if msg is not None and msg.arbitration_id == RESPONSE_ID:
+                    return msg
+                continue
+
+            idle = not selector.select(timeout=min(FRAME_TIMEOUT, remaining))
+            if idle:
+                continue
+            can_id, dlc, data = _CAN_FRAME.unpack(
+                bus.socket.recv(_CAN_FRAME.size, socket.MSG_DONTWAIT)
+            )
+        except BlockingIOError:
+            continue
+        except Exception as e:
+            if has_ctx:
+                context.log(f"Error receiving CAN message: {e}", "ERROR")
+            continue
+
+        if can_id != RESPONSE_ID:  # also rejects EFF/RTR/ERR flagged frames
+            continue
+        return can.Message(
+            arbitration_id=RESPONSE_ID,
+            is_extended_id=False,
+            dlc=dlc,
+            data=data[:dlc],
+            timestamp=time.time(),
+        )
+
+
+def _wait(context, seconds: float) -> None:
+    """
+    Idle between stream reads. context.sleep() stays responsive to
+    pause/cancel; a bare time.sleep() would block the task thread.
+    """
+    if context:
+        context.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+class VoltageReading(NamedTuple):
+    """One E1 42 read. Converted to a dict only at the public API boundary."""
+    battery_voltage: Optional[float]
+    message: str
+    raw: Optional[Dict[str, Any]]
+
+
 def _serialize_can_message(msg: can.Message) -> Dict[str, Any]:
     return {
         "arbitration_id": f"{msg.arbitration_id:03X}",
         "is_extended_id": bool(msg.is_extended_id),
         "dlc": int(msg.dlc),
-        "data": [f"{b:02X}" for b in msg.data],
+        "data": [_HEX[b] for b in msg.data],
         "timestamp": float(getattr(msg, "timestamp", 0.0) or 0.0),
     }
 
 
-def _read_voltage_once(bus: BusABC, *, context=None, progress=None) -> Dict[str, Any]:
+# ReadDataByIdentifier 22 E1 42 never changes: build the frame, its log line
+# and its serialized form once instead of on every stream tick.
+_REQ_DATA = bytes([0x03, 0x22, 0xE1, 0x42, 0x00, 0x00, 0x00, 0x00])
+_REQ_MSG = can.Message(arbitration_id=REQUEST_ID, is_extended_id=False, data=_REQ_DATA)
+_REQ_LOG = f"Tx {REQUEST_ID:03X} " + _REQ_DATA.hex(" ").upper()
+_REQ_SERIALIZED = _serialize_can_message(_REQ_MSG)
+
+# Positive response: PCI, SID 62, DID E1 42 (big-endian), value byte
+_POS_RESP = struct.Struct(">xBHB")
+
+
+def _read_voltage_once(
+    bus: BusABC,
+    *,
+    context=None,
+    progress=None,
+    selector=None,
+    include_raw: bool = False,
+    drain: bool = True,
+) -> VoltageReading:
     """
     Send UDS ReadDataByIdentifier (22 E1 42) once and parse response.
-    Returns dict with battery_voltage, message, raw.
+    Returns a VoltageReading (battery_voltage, message, raw).
+    raw (serialized request/response frames) is only built when
+    include_raw=True; otherwise it is None.
+    drain=False skips flushing queued frames before the request; only safe
+    when the previous exchange on this bus got its reply.
     Raises TimeoutError on no response.
     """
-    def log(msg: str, level: str = "INFO"):
+    # Frame traces go to the task log; standalone they are DEBUG-only, so
+    # skip building the hex strings when nobody will read them.
+    trace = context is not None or logger.isEnabledFor(logging.DEBUG)
+
+    def log_frame(line: str):
         if context:
-            context.log(msg, level)
+            context.log(line)
         else:
-            print(f"[{level}] {msg}")
+            _log_debug(line)
 
     if context:
-        context.checkpoint()
         context.progress(10, "Sending UDS request (22 E1 42)")
     if progress:
         progress(10, "Sending UDS request (22 E1 42)")
 
-    req = can.Message(
-        arbitration_id=0x7F0,
-        is_extended_id=False,
-        data=[0x03, 0x22, 0xE1, 0x42, 0x00, 0x00, 0x00, 0x00],
-    )
-    log(f"Tx {req.arbitration_id:03X} " + " ".join(f"{b:02X}" for b in req.data))
-    
+    if trace:
+        log_frame(_REQ_LOG)
+
+    if drain:
+        _drain_rx(bus, selector)
+
     try:
-        bus.send(req)
+        bus.send(_REQ_MSG)
     except Exception as e:
-        log(f"Failed to send CAN message: {e}", "ERROR")
+        if context:
+            context.log(f"Failed to send CAN message: {e}", "ERROR")
+        else:
+            _log_error(f"Failed to send CAN message: {e}")
         raise
 
     if context:
         context.progress(35, "Waiting for ECU response")
 
-    deadline = time.time() + 2.0
-    resp = None
-    while time.time() < deadline:
-        if context:
-            context.checkpoint()
-
-        try:
-            msg = bus.recv(timeout=0.3)
-        except Exception as e:
-            log(f"Error receiving CAN message: {e}", "ERROR")
-            continue
-            
-        if not msg:
-            continue
-        if msg.arbitration_id != 0x7F1:
-            continue
-
-        log(f"Rx {msg.arbitration_id:03X} " + " ".join(f"{b:02X}" for b in msg.data))
-        resp = msg
-        break
-
+    resp = _recv_response(bus, selector, time.monotonic() + RESPONSE_TIMEOUT, context=context)
     if not resp:
         raise TimeoutError("No response from ECU for DID E1 42")
 
+    if trace:
+        log_frame(f"Rx {resp.arbitration_id:03X} " + resp.data.hex(" ").upper())
+
+    raw = None
+    if include_raw:
+        raw = {"request": _REQ_SERIALIZED, "response": _serialize_can_message(resp)}
+
     # Positive response format: 62 E1 42 XX ...
-    if not (len(resp.data) >= 5 and resp.data[1] == 0x62 and resp.data[2] == 0xE1 and resp.data[3] == 0x42):
-        return {
-            "battery_voltage": None,
-            "message": "Invalid response",
-            "raw": {"request": _serialize_can_message(req), "response": _serialize_can_message(resp)},
-        }
+    if len(resp.data) < _POS_RESP.size:
+        return VoltageReading(None, "Invalid response", raw)
+    sid, did, raw_value = _POS_RESP.unpack_from(resp.data)  # raw_value: 0.1 V
+    if sid != 0x62 or did != 0xE142:
+        return VoltageReading(None, "Invalid response", raw)
+
+    return VoltageReading(raw_value / 10, f"{raw_value // 10}.{raw_value % 10} V", raw)
+
+
+# Streams reading E1 42 on the same channel (e.g. section auto-run plus a
+# Live Parameter test) that collide share one request/response instead of
+# queueing back-to-back requests on the bus.
+_SHARED_LOCK = threading.Lock()
+_CHANNEL_LOCKS: Dict[str, threading.Lock] = {}
+# Completed exchanges per channel; a waiter reuses _LAST_READ only if the
+# generation moved while it was blocked on the channel lock
+_GENERATION: Dict[str, int] = {}
+_LAST_READ: Dict[str, VoltageReading] = {}
+# Channels whose last request timed out and may still get a late reply
+_NEEDS_DRAIN: Dict[str, bool] = {}
+
+
+def _read_voltage_shared(
+    bus: BusABC,
+    channel: str,
+    *,
+    context=None,
+    progress=None,
+    selector=None,
+    include_raw: bool = False,
+) -> VoltageReading:
+    """
+    Single-flight wrapper around _read_voltage_once, keyed by channel.
+    A caller arriving while another stream's exchange is in flight waits
+    for it and reuses that exchange's result; a caller that finds the
+    channel idle always does its own exchange. include_raw callers
+    (single-shot) always do their own exchange, still under the lock, so
+    no two exchanges on a pooled bus compete for the same reply.
+    Queued frames are only drained after a timeout, the one case where a
+    late reply can be left on the bus.
+    """
+    key = (channel or "").strip()
+    with _SHARED_LOCK:
+        lock = _CHANNEL_LOCKS.setdefault(key, threading.Lock())
+        seen = _GENERATION.get(key, 0)
 
-    voltage = resp.data[4] * 0.1  # 0.1 V resolution
-    return {
-        "battery_voltage": float(voltage),
-        "message": f"{voltage:.1f} V",
-        "raw": {"request": _serialize_can_message(req), "response": _serialize_can_message(resp)},
-    }
+    while not lock.acquire(timeout=FRAME_TIMEOUT):
+        if context:
+            context.checkpoint()
+    try:
+        if not include_raw and _GENERATION.get(key, 0) != seen:
+            return _LAST_READ[key]
+        drain = _NEEDS_DRAIN.get(key, True)
+        _NEEDS_DRAIN[key] = True
+        # The pool's lock also serializes against other modules on this bus
+        with (shared_bus_lock(bus) if shared_bus_lock is not None else nullcontext()):
+            result = _read_voltage_once(
+                bus, context=context, progress=progress, selector=selector,
+                include_raw=include_raw, drain=drain,
+            )
+        _NEEDS_DRAIN[key] = False
+        _LAST_READ[key] = result
+        _GENERATION[key] = _GENERATION.get(key, 0) + 1
+        return result
+    finally:
+        lock.release()
 
 
 def read_battery_voltage(
@@ -154,6 +424,7 @@ def read_battery_voltage(
     Returns a dict: {"battery_voltage": float|None, "message": str, "raw": {...}}
     """
     bus = None
+    selector = None
     try:
         if context:
             context.checkpoint()
@@ -161,7 +432,7 @@ def read_battery_voltage(
         if progress:
             progress(5, "Opening CAN bus")
 
-        bus = _open_bus(can_interface, int(bitrate))
+        bus = _acquire_bus(can_interface, int(bitrate))
         if bus is None:
             error_msg = f"Failed to open CAN bus: {can_interface}"
             if context:
@@ -172,16 +443,20 @@ def read_battery_voltage(
                 "raw": None,
             }
 
-        result = _read_voltage_once(bus, context=context, progress=progress)
+        selector = _make_selector(bus)
+        result = _read_voltage_shared(
+            bus, can_interface, context=context, progress=progress, selector=selector,
+            include_raw=True,
+        )
 
         if context:
-            if result.get("battery_voltage") is not None:
-                context.progress(100, f"Battery Voltage: {result['battery_voltage']:.1f} V")
-                context.progress_json({"battery_voltage": result["battery_voltage"]})
+            if result.battery_voltage is not None:
+                context.progress(100, f"Battery Voltage: {result.message}")
+                context.progress_json({"battery_voltage": result.battery_voltage})
             else:
                 context.progress(100, "Battery Voltage read: invalid response")
 
-        return result
+        return result._asdict()
 
     except Exception as e:
         error_msg = f"Battery voltage read failed: {e}"
@@ -193,9 +468,11 @@ def read_battery_voltage(
             "raw": None,
         }
     finally:
+        if selector:
+            selector.close()
         if bus:
             try:
-                bus.shutdown()
+                _release_bus(bus)
             except Exception:
                 pass
 
@@ -218,8 +495,12 @@ def read_battery_voltage_stream(
       - persist per-signal values.
 
     Cancellation/pause are honored via context.checkpoint().
+
+    The yielded dict is reused between samples; consumers must copy it if
+    they need to keep a value past the next iteration.
     """
     bus = None
+    selector = None
     iteration = 0
     
     try:
@@ -230,7 +511,7 @@ def read_battery_voltage_stream(
         if progress:
             progress(5, "Opening CAN bus")
 
-        bus = _open_bus(can_interface, int(bitrate))
+        bus = _acquire_bus(can_interface, int(bitrate))
         if bus is None:
             error_msg = f"Failed to open CAN bus: {can_interface}"
             if context:
@@ -241,10 +522,18 @@ def read_battery_voltage_stream(
             }
             return
 
+        selector = _make_selector(bus)
         if context:
             context.log("BATTERY STREAM: CAN bus opened successfully", "INFO")
 
+        # Yielded dicts are reused every tick: runner/service consume a sample
+        # synchronously (progress_json + persist) before the next one.
+        sample: Dict[str, Any] = {}
+        out = {"status": "streaming", "data": sample}
+        no_data = {"status": "streaming", "data": {}}
+
         # Loop forever (runner will cancel or service will stop session)
+        next_tick = time.monotonic()
         while True:
             iteration += 1
             if context:
@@ -253,14 +542,16 @@ def read_battery_voltage_stream(
                     context.log(f"BATTERY STREAM: Iteration {iteration}", "DEBUG")
 
             try:
-                single = _read_voltage_once(bus, context=context, progress=progress)
+                single = _read_voltage_shared(
+                    bus, can_interface, context=context, progress=progress, selector=selector
+                )
             except TimeoutError:
                 # On timeout in stream: just indicate "no data" / skip this tick
                 if context:
                     context.progress(60, "No response (retrying)")
                 if progress:
                     progress(60, "No response (retrying)")
-                time.sleep(0.3)
+                _wait(context, FRAME_TIMEOUT)
                 continue
             except Exception as e:
                 # Unexpected error
@@ -270,37 +561,35 @@ def read_battery_voltage_stream(
                     "status": "error",
                     "data": {"error": str(e)}
                 }
-                time.sleep(1.0)  # Back off on error
+                _wait(context, 1.0)  # Back off on error
                 continue
 
-            value = single.get("battery_voltage")
+            value = single.battery_voltage
             if value is not None:
                 if context:
-                    context.progress(100, f"Battery Voltage: {value:.1f} V")
+                    context.progress(100, f"Battery Voltage: {single.message}")
                     if iteration % 5 == 0:  # Log every 5 successful reads
-                        context.log(f"BATTERY STREAM: Read {value:.1f}V (iteration {iteration})", "INFO")
+                        context.log(f"BATTERY STREAM: Read {single.message} (iteration {iteration})", "INFO")
                 if progress:
-                    progress(100, f"Battery Voltage: {value:.1f} V")
+                    progress(100, f"Battery Voltage: {single.message}")
 
                 # YIELD for runner → service.on_stream_data → DB persist
-                yield {
-                    "status": "streaming", 
-                    "data": {"battery_voltage": value}
-                }
+                sample["battery_voltage"] = value
+                yield out
             else:
                 # Invalid frame
                 if context:
                     context.log("BATTERY STREAM: Invalid response received", "WARN")
-                yield {
-                    "status": "streaming", 
-                    "data": {}
-                }
-
-            # Pace (runner timeout for streams defaults to 0 = no timeout)
-            if context:
-                context.sleep(0.4)
+                yield no_data
+
+            # Pace on a fixed schedule so read time doesn't stretch the period
+            # (runner timeout for streams defaults to 0 = no timeout)
+            next_tick += READ_INTERVAL
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                _wait(context, delay)
             else:
-                time.sleep(0.4)
+                next_tick = time.monotonic()  # overran (slow read): resync
 
     except GeneratorExit:
         # Handle generator cleanup gracefully
@@ -316,11 +605,19 @@ def read_battery_voltage_stream(
     finally:
         if context:
             context.log("BATTERY STREAM: Shutting down", "INFO")
+        if selector:
+            selector.close()
         if bus:
             try:
-                bus.shutdown()
+                _release_bus(bus)
                 if context:
-                    context.log("BATTERY STREAM: CAN bus closed", "INFO")
+                    context.log("BATTERY STREAM: CAN bus released", "INFO")
             except Exception as e:
                 if context:
                     context.log(f"BATTERY STREAM: Error closing bus: {e}", "ERROR")
+
+
+__all__ = [
+    "read_battery_voltage",
+    "read_battery_voltage_stream",
+]
@@ -5,6 +5,7 @@ CAN UTILITIES (FINAL – PRODUCTION READY, APP.SCHEMA SAFE)
 Responsibilities:
 ✔ Resolve CAN configuration from DB (app.config)
 ✔ Open / close CAN bus safely
+✔ Share one refcounted CAN bus per channel between programs
 ✔ Provide reusable CAN helpers for diagnostic services & test programs
 ✔ No test-specific logic (VIN/DTC/etc.)
 ✔ Compatible with python-can
@@ -21,32 +22,117 @@ Expected keys:
 
 from __future__ import annotations
 
-from typing import Optional, Dict, Any
+import os
+import time
+import threading
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple, NamedTuple, ContextManager
 
-from can import interface, Bus  # python-can
-from database import query_one, execute
+from database import query_one, query_all, execute
+
+if TYPE_CHECKING:
+    from can import Bus  # python-can
+
+# python-can is imported on first bus use: the web app imports this module
+# for the config helpers alone and shouldn't pay for loading CAN drivers.
+_can = None
+
+
+def _python_can():
+    """Return the python-can module, importing it on first call."""
+    global _can
+    if _can is None:
+        import can
+        _can = can
+    return _can
 
 
 # =============================================================================
 # CONFIG HELPERS (POSTGRESQL SAFE)
 # =============================================================================
 
+# Fixed statement text, so the driver's prepared-statement cache can reuse
+# the plan for every call.
+_Q_GET_CONFIG = "SELECT value_text FROM app.config WHERE key_name = :k"
+_Q_GET_CONFIGS = "SELECT key_name, value_text FROM app.config WHERE key_name = ANY(:keys)"
+_Q_UPSERT_CONFIG = """
+    INSERT INTO app.config (key_name, value_text)
+    VALUES (:k, :v)
+    ON CONFLICT (key_name)
+    DO UPDATE SET value_text = EXCLUDED.value_text
+"""
+
+# CAN settings practically never change at runtime, so DB reads are cached
+# for a short TTL. The cache is per process: set_config_value() invalidates
+# only the writing process, so other workers may serve the old value for up
+# to CONFIG_CACHE_TTL_SEC (env NIRIX_CONFIG_CACHE_TTL_SEC; 0 disables).
+# Missing keys are never cached, so a newly configured key shows up on the
+# next read everywhere.
+CONFIG_CACHE_TTL_SEC = float(os.getenv("NIRIX_CONFIG_CACHE_TTL_SEC", "5"))
+
+# key -> (value_text, monotonic fetch time); present keys only
+_CONFIG_CACHE: Dict[str, Tuple[str, float]] = {}
+
+
 def get_config_value(key: str, default: Optional[str] = None) -> Optional[str]:
     """
-    Read a configuration value from DB (app.config).
+    Read a configuration value from DB (app.config), cached for
+    CONFIG_CACHE_TTL_SEC.
     """
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None and (time.monotonic() - cached[1]) < CONFIG_CACHE_TTL_SEC:
+        return cached[0]
+
     try:
-        row = query_one(
-            "SELECT value_text FROM app.config WHERE key_name = :k",
-            {"k": key},
-        )
-        if row and row.get("value_text") is not None:
-            return row["value_text"]
-        return default
+        row = query_one(_Q_GET_CONFIG, {"k": key})
     except Exception:
-        # If DB not available or table missing, fall back
+        # If DB not available or table missing, fall back (not cached)
         return default
 
+    value = row.get("value_text") if row else None
+    if value is None:
+        _CONFIG_CACHE.pop(key, None)
+        return default
+    _CONFIG_CACHE[key] = (value, time.monotonic())
+    return value
+
+
+def get_config_values(keys: List[str]) -> Dict[str, str]:
+    """
+    Read several configuration values from DB in one round-trip.
+    Keys that are missing (or NULL) are left out of the result.
+    Shares the get_config_value() cache.
+    """
+    now = time.monotonic()
+    values: Dict[str, str] = {}
+    to_fetch: List[str] = []
+    for key in keys:
+        cached = _CONFIG_CACHE.get(key)
+        if cached is not None and (now - cached[1]) < CONFIG_CACHE_TTL_SEC:
+            values[key] = cached[0]
+        else:
+            to_fetch.append(key)
+
+    if not to_fetch:
+        return values
+
+    try:
+        rows = query_all(_Q_GET_CONFIGS, {"keys": to_fetch})
+    except Exception:
+        # If DB not available or table missing, fall back (not cached)
+        return values
+
+    fetched = {row["key_name"]: row.get("value_text") for row in rows or []}
+    now = time.monotonic()
+    for key in to_fetch:
+        value = fetched.get(key)
+        if value is None:
+            _CONFIG_CACHE.pop(key, None)
+            continue
+        _CONFIG_CACHE[key] = (value, now)
+        values[key] = value
+    return values
+
 
 def set_config_value(key: str, value: str) -> None:
     """
@@ -54,24 +140,50 @@ def set_config_value(key: str, value: str) -> None:
     Requires UNIQUE constraint on app.config.key_name.
     """
     try:
-        execute(
-            """
-            INSERT INTO app.config (key_name, value_text)
-            VALUES (:k, :v)
-            ON CONFLICT (key_name)
-            DO UPDATE SET value_text = EXCLUDED.value_text
-            """,
-            {"k": key, "v": str(value)},
-        )
+        execute(_Q_UPSERT_CONFIG, {"k": key, "v": str(value)})
     except Exception:
         # silently ignore (caller may run without DB during tests)
         pass
+    finally:
+        _CONFIG_CACHE.pop(key, None)
+        invalidate_can_config_cache()
 
 
 # =============================================================================
 # CAN CONFIG RESOLUTION
 # =============================================================================
 
+class CanConfig(NamedTuple):
+    """
+    Resolved CAN configuration. Immutable, so the cached instance is
+    handed out as-is. Use to_dict() where a plain dict is needed.
+    """
+    backend: str   # "pcan" | "socketcan"
+    channel: str   # "PCAN_USBBUS1" | "can0"
+    bitrate: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+# Keys read by get_can_config_tuple(), fetched in one query
+_CAN_CONFIG_KEYS = ("can_backend", "can_interface", "can_bitrate", "vci_mode")
+
+# (monotonic resolve time, resolved config); same TTL as the key cache
+_CAN_CONFIG_CACHE: Optional[Tuple[float, CanConfig]] = None
+
+
+def invalidate_can_config_cache() -> None:
+    """
+    Drop the cached get_can_config_tuple() result (and cached CAN keys).
+    Called by set_config_value(); call it after editing app.config directly.
+    """
+    global _CAN_CONFIG_CACHE
+    _CAN_CONFIG_CACHE = None
+    for key in _CAN_CONFIG_KEYS:
+        _CONFIG_CACHE.pop(key, None)
+
+
 def get_can_config() -> Dict[str, Any]:
     """
     Resolve CAN configuration from DB.
@@ -83,15 +195,39 @@ def get_can_config() -> Dict[str, Any]:
         "bitrate": 500000
       }
     """
-    backend_raw = (get_config_value("can_backend", "PCAN") or "").strip().upper()
+    return get_can_config_tuple().to_dict()
 
-    interface_name = (get_config_value("can_interface", "") or "").strip()
-    bitrate_text = (get_config_value("can_bitrate", "500000") or "500000").strip()
+
+def get_can_config_tuple() -> CanConfig:
+    """
+    Resolve CAN configuration from DB as an immutable CanConfig, cached for
+    CONFIG_CACHE_TTL_SEC. Used internally by open_can_bus(); the cached
+    instance is handed out as-is.
+    """
+    global _CAN_CONFIG_CACHE
+    cached = _CAN_CONFIG_CACHE
+    if cached is not None and (time.monotonic() - cached[0]) < CONFIG_CACHE_TTL_SEC:
+        return cached[1]
+
+    values = get_config_values(list(_CAN_CONFIG_KEYS))
+    cfg = _resolve_can_config(values)
+    # Defaults filled in for missing keys are not cached (see _CONFIG_CACHE)
+    if "can_interface" in values:
+        _CAN_CONFIG_CACHE = (time.monotonic(), cfg)
+    return cfg
+
+
+def _resolve_can_config(values: Dict[str, str]) -> CanConfig:
+
+    backend_raw = (values.get("can_backend", "PCAN") or "").strip().upper()
+
+    interface_name = (values.get("can_interface", "") or "").strip()
+    bitrate_text = (values.get("can_bitrate", "500000") or "500000").strip()
 
     # Defaults if not configured
     if not interface_name:
         # keep backward compatibility: if vci_mode is present, infer
-        vci_mode = (get_config_value("vci_mode", "") or "").strip().lower()
+        vci_mode = (values.get("vci_mode", "") or "").strip().lower()
         if vci_mode == "socketcan":
             interface_name = "can0"
             backend_raw = "SOCKETCAN"
@@ -105,16 +241,23 @@ def get_can_config() -> Dict[str, Any]:
         bitrate = 500000
 
     if backend_raw == "SOCKETCAN":
-        return {"backend": "socketcan", "channel": interface_name, "bitrate": bitrate}
+        return CanConfig("socketcan", interface_name, bitrate)
 
     # Default: PCAN
-    return {"backend": "pcan", "channel": interface_name, "bitrate": bitrate}
+    return CanConfig("pcan", interface_name, bitrate)
 
 
 # =============================================================================
 # CAN BUS MANAGEMENT
 # =============================================================================
 
+# Backend name -> python-can bustype. Add more backends here if needed.
+_BACKEND_BUSTYPES: Dict[str, str] = {
+    "pcan": "pcan",
+    "socketcan": "socketcan",
+}
+
+
 def open_can_bus(
     *,
     channel: Optional[str] = None,
@@ -126,32 +269,29 @@ def open_can_bus(
 
     If parameters are omitted, values are resolved from DB (app.config).
     """
-    cfg = get_can_config()
+    if not (channel and bitrate and backend):
+        cfg = get_can_config_tuple()
+        channel = channel or cfg.channel
+        bitrate = bitrate or cfg.bitrate
+        backend = backend or cfg.backend
 
-    channel = (channel or cfg["channel"] or "").strip()
-    bitrate = int(bitrate or cfg["bitrate"] or 500000)
-    backend = (backend or cfg["backend"] or "pcan").strip().lower()
+    channel = (channel or "").strip()
+    bitrate = int(bitrate or 500000)
+    backend = (backend or "pcan").strip().lower()
 
     if not channel:
         raise ValueError("CAN channel is required")
 
-    # python-can: interface.Bus(channel=..., bustype=..., bitrate=...)
-    if backend == "pcan":
-        return interface.Bus(
-            channel=channel,
-            bustype="pcan",
-            bitrate=bitrate,
-        )
-
-    if backend == "socketcan":
-        return interface.Bus(
-            channel=channel,
-            bustype="socketcan",
-            bitrate=bitrate,
-        )
+    bustype = _BACKEND_BUSTYPES.get(backend)
+    if bustype is None:
+        raise ValueError(f"Unsupported CAN backend: {backend}")
 
-    # Add more backends if needed
-    raise ValueError(f"Unsupported CAN backend: {backend}")
+    # python-can: can.Bus(channel=..., bustype=..., bitrate=...)
+    return _python_can().Bus(
+        channel=channel,
+        bustype=bustype,
+        bitrate=bitrate,
+    )
 
 
 def close_can_bus(bus: Optional[Bus]) -> None:
@@ -165,6 +305,176 @@ def close_can_bus(bus: Optional[Bus]) -> None:
         pass
 
 
+# =============================================================================
+# SHARED CAN BUS POOL
+# =============================================================================
+# PCAN only allows one Bus per channel, and opening one costs 50–200 ms of
+# driver init. Stream programs therefore share one refcounted Bus per
+# (backend, channel): the first caller opens it, the last release shuts it
+# down. Receive filters requested by the users are merged, so a shared bus
+# may deliver frames another user asked for.
+#
+# All users read from ONE receive queue: each frame reaches only one reader.
+# A request/response exchange on a shared bus must therefore hold
+# shared_bus_lock(bus) from send until its reply is read, or concurrent
+# users steal (or drain) each other's responses.
+
+_SHARED_BUSES: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_SHARED_BUSES_LOCK = threading.Lock()
+
+
+def _merged_filters(entry: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Union of all users' filters; None (accept all) if any user wants everything."""
+    merged: List[Dict[str, Any]] = []
+    for flt in entry["filters"]:
+        if not flt:
+            return None
+        merged.extend(f for f in flt if f not in merged)
+    return merged
+
+
+def get_or_open_can_bus(
+    *,
+    channel: Optional[str] = None,
+    bitrate: Optional[int] = None,
+    backend: Optional[str] = None,
+    filters: Optional[List[Dict[str, Any]]] = None,
+) -> Bus:
+    """
+    Return the shared Bus for (backend, channel), opening it on first use.
+
+    Every successful call must be paired with release_can_bus(bus).
+    `filters` uses python-can's set_filters format; it is merged with the
+    filters of the bus's other users.
+
+    The bus is NOT safe for concurrent receive: hold shared_bus_lock(bus)
+    around each send/receive exchange.
+
+    Raises ValueError if the channel is already open at a different bitrate.
+    """
+    if not (channel and backend and bitrate):
+        cfg = get_can_config_tuple()
+        channel = channel or cfg.channel
+        backend = backend or cfg.backend
+        bitrate = bitrate or cfg.bitrate
+    channel = (channel or "").strip()
+    backend = (backend or "pcan").strip().lower()
+    bitrate = int(bitrate or 500000)
+    key = (backend, channel)
+
+    while True:
+        with _SHARED_BUSES_LOCK:
+            entry = _SHARED_BUSES.get(key)
+            opener = entry is None
+            if opener:
+                # Placeholder: the driver init below runs without the global
+                # lock; other callers for this key wait on "ready".
+                entry = {"bus": None, "bitrate": bitrate, "refs": 0, "filters": [],
+                         "ready": threading.Event(), "lock": threading.RLock()}
+                _SHARED_BUSES[key] = entry
+            elif entry["bitrate"] != bitrate:
+                raise ValueError(
+                    f"CAN channel {channel} already open at {entry['bitrate']} bps, "
+                    f"requested {bitrate} bps"
+                )
+            elif entry["bus"] is not None:
+                return _attach_shared_user(key, entry, filters)
+
+        if not opener:
+            entry["ready"].wait()
+            continue  # re-check: the opener may have failed
+
+        try:
+            bus = open_can_bus(channel=channel, bitrate=bitrate, backend=backend)
+        except Exception:
+            with _SHARED_BUSES_LOCK:
+                _SHARED_BUSES.pop(key, None)
+            entry["ready"].set()
+            raise
+
+        with _SHARED_BUSES_LOCK:
+            entry["bus"] = bus
+        entry["ready"].set()
+        # Loop once more to attach through the normal path
+
+
+def _attach_shared_user(
+    key: Tuple[str, str],
+    entry: Dict[str, Any],
+    filters: Optional[List[Dict[str, Any]]],
+) -> Bus:
+    """Register one user on a pooled bus. Caller holds _SHARED_BUSES_LOCK."""
+    entry["filters"].append(list(filters) if filters else None)
+    try:
+        entry["bus"].set_filters(_merged_filters(entry))
+    except Exception:
+        entry["filters"].pop()
+        if entry["refs"] == 0:
+            _SHARED_BUSES.pop(key, None)
+            close_can_bus(entry["bus"])
+        raise
+
+    entry["refs"] += 1
+    return entry["bus"]
+
+
+def shared_bus_lock(bus: Optional[Bus]) -> ContextManager[Any]:
+    """
+    Lock serializing request/response exchanges on a pooled bus.
+
+        with shared_bus_lock(bus):
+            send_can_frame(bus, req_id, payload)
+            resp = recv_can_frame(bus, timeout, expected_id=res_id)
+
+    Reentrant. Buses not from the pool get a no-op context (private
+    sockets see every frame).
+    """
+    with _SHARED_BUSES_LOCK:
+        for entry in _SHARED_BUSES.values():
+            if entry["bus"] is bus:
+                return entry["lock"]
+    return nullcontext()
+
+
+def release_can_bus(
+    bus: Optional[Bus],
+    filters: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    Drop one reference to a bus from get_or_open_can_bus().
+
+    Pass the same `filters` used when acquiring it. The bus is shut down
+    when the last user releases it. Buses not from the pool are closed.
+    """
+    if bus is None:
+        return
+
+    with _SHARED_BUSES_LOCK:
+        for key, entry in _SHARED_BUSES.items():
+            if entry["bus"] is bus:
+                break
+        else:
+            close_can_bus(bus)
+            return
+
+        try:
+            entry["filters"].remove(list(filters) if filters else None)
+        except ValueError:
+            pass
+
+        entry["refs"] -= 1
+        if entry["refs"] > 0:
+            try:
+                bus.set_filters(_merged_filters(entry))
+            except Exception:
+                pass
+            return
+
+        _SHARED_BUSES.pop(key, None)
+
+    close_can_bus(bus)
+
+
 # =============================================================================
 # GENERIC DIAGNOSTIC HELPERS
 # =============================================================================
@@ -179,9 +489,7 @@ def send_can_frame(
     """
     Send one CAN frame.
     """
-    from can import Message
-
-    msg = Message(
+    msg = _python_can().Message(
         arbitration_id=arbitration_id,
         data=data,
         is_extended_id=is_extended_id,
@@ -189,11 +497,38 @@ def send_can_frame(
     bus.send(msg)
 
 
-def recv_can_frame(bus: Bus, timeout: float = 1.0):
+def recv_can_frame(bus: Bus, timeout: float = 1.0, *, expected_id: Optional[int] = None):
     """
     Receive one CAN frame.
+
+    With `expected_id`, frames with other arbitration IDs are skipped until
+    the timeout (time.monotonic() based) expires. Returns None on timeout.
+    """
+    if expected_id is None:
+        return bus.recv(timeout)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        msg = bus.recv(remaining)
+        if msg is None:
+            return None
+        if msg.arbitration_id == expected_id:
+            return msg
+
+
+def send_and_wait_response(bus: Bus, request, response_id: int, timeout: float = 1.0):
     """
-    return bus.recv(timeout)
+    Send a prebuilt can.Message and wait for the frame with `response_id`.
+
+    Repeated requests (polling, retries) should build the Message once and
+    pass it here rather than have send_can_frame() rebuild it every time.
+    Returns None on timeout.
+    """
+    bus.send(request)
+    return recv_can_frame(bus, timeout, expected_id=response_id)
 
 
 # =============================================================================
@@ -207,6 +542,13 @@ class CanSession:
     Usage:
         with CanSession() as bus:
             ...
+
+        with CanSession(shared=True) as bus:   # bus from the shared pool
+            with shared_bus_lock(bus):         # one exchange at a time
+                ...
+
+    A shared bus has one receive queue for all its users; see
+    shared_bus_lock().
     """
 
     def __init__(
@@ -215,14 +557,22 @@ class CanSession:
         channel: Optional[str] = None,
         bitrate: Optional[int] = None,
         backend: Optional[str] = None,
+        shared: bool = False,
     ):
         self._params = {"channel": channel, "bitrate": bitrate, "backend": backend}
+        self._shared = shared
         self.bus: Optional[Bus] = None
 
     def __enter__(self) -> Bus:
-        self.bus = open_can_bus(**self._params)
+        if self._shared:
+            self.bus = get_or_open_can_bus(**self._params)
+        else:
+            self.bus = open_can_bus(**self._params)
         return self.bus
 
     def __exit__(self, exc_type, exc, tb) -> None:
-        close_can_bus(self.bus)
+        if self._shared:
+            release_can_bus(self.bus)
+        else:
+            close_can_bus(self.bus)
         self.bus = None
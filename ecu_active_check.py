@@ -2,7 +2,11 @@
 """
 AUTO_ECU_ACTIVE_CHECK (single)
 
-- Returns ecus_ok (1/0) so runner output_limits can fail the program
+Entry points:
+  check_ecu_active  – one ECU (ecu_tests.json), returns is_active (1/0)
+  check_all_ecus    – several ECUs in one pass, returns ecus_ok (1/0)
+
+- Returns ecus_ok / is_active (1/0) so runner output_limits can fail the program
 - Returns ecu_statuses list so service can persist to app.ecu_active_status
 - Does NOT raise RuntimeError just because ECU is inactive (so output is preserved)
 """
@@ -11,11 +15,13 @@ from __future__ import annotations
 
 import time
 import logging
-from typing import Dict, Any, Optional, List
+from collections import ChainMap
+from typing import Dict, Any, Optional, List, Tuple, Container
 
 import can
 
 logging.getLogger("can").setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
 
 ECU_ADDRS: Dict[str, Dict[str, int]] = {
     "BMS": {"req": 0x7F0, "res": 0x7F1},
@@ -23,6 +29,8 @@ ECU_ADDRS: Dict[str, Dict[str, int]] = {
 
 DEFAULT_ECUS: List[str] = ["BMS"]
 
+RECV_SLICE = 0.5  # max single bus.recv wait (bounds cancel latency)
+
 try:
     from diagnostics.runner import DiagnosticNegativeResponse  # type: ignore
 except Exception:
@@ -44,6 +52,18 @@ def _log(context, msg: str, level: str = "INFO"):
     print(f"[{level}] {msg}")
 
 
+def _trace_on(context) -> bool:
+    """Frame traces go to the task log; standalone they are DEBUG-only."""
+    return context is not None or logger.isEnabledFor(logging.DEBUG)
+
+
+def _log_frame(context, line: str):
+    if context is not None:
+        _log(context, line)
+    else:
+        logger.debug(line)
+
+
 def _open_bus(can_interface: str, bitrate: int) -> can.Bus:
     iface = (can_interface or "").strip()
     if iface.upper().startswith("PCAN"):
@@ -53,41 +73,69 @@ def _open_bus(can_interface: str, bitrate: int) -> can.Bus:
     raise ValueError(f"Unsupported CAN interface: {iface}")
 
 
+UDS_TESTER_PRESENT = 0x3E
+UDS_POSITIVE_RESPONSE_MASK = 0x40
+UDS_NEGATIVE_RESPONSE = 0x7F
+_TP_POSITIVE_SID = UDS_TESTER_PRESENT | UDS_POSITIVE_RESPONSE_MASK  # 0x7E
+
+# TesterPresent (3E 00) never changes: build each request ID's frame and
+# its log line once and reuse them on every check.
+_TP_PAYLOAD = bytes((0x02, UDS_TESTER_PRESENT, 0x00, 0, 0, 0, 0, 0))
+_TP_MSG_CACHE: Dict[int, Tuple[can.Message, str]] = {}
+
+
 def _send_tester_present(bus: can.Bus, req_id: int, context=None):
-    data = bytearray([0x02, 0x3E, 0x00, 0, 0, 0, 0, 0])
-    msg = can.Message(arbitration_id=req_id, data=data, is_extended_id=False)
-    _log(context, f"TX {req_id:03X} " + " ".join(f"{b:02X}" for b in msg.data))
+    cached = _TP_MSG_CACHE.get(req_id)
+    if cached is None:
+        msg = can.Message(arbitration_id=req_id, data=_TP_PAYLOAD, is_extended_id=False)
+        cached = _TP_MSG_CACHE[req_id] = (msg, f"TX {req_id:03X} " + _TP_PAYLOAD.hex(" ").upper())
+    msg, line = cached
+    if _trace_on(context):
+        _log_frame(context, line)
     bus.send(msg)
 
 
-def _recv_sf_payload(bus: can.Bus, res_id: int, timeout_sec: float, context=None) -> Optional[bytes]:
-    end = time.monotonic() + max(0.0, float(timeout_sec or 0.0))
+def _recv_sf_payload(
+    bus: can.Bus, res_ids: Container[int], end: float, context=None
+) -> Tuple[Optional[int], Optional[memoryview]]:
+    """
+    Wait until `end` (time.monotonic()) for a single-frame reply on any of
+    `res_ids`. Returns (res_id, payload), or (None, None) on timeout.
+    The payload is a zero-copy view into the received frame's data.
+    """
+    # Hot loop: bind per-iteration lookups to locals once
+    recv = bus.recv
+    now = time.monotonic
+    checkpoint = context.checkpoint if context is not None else None
+    trace = _trace_on(context)
+
     while True:
-        if context:
-            context.checkpoint()
+        if checkpoint:
+            checkpoint()
 
-        remaining = end - time.monotonic()
+        remaining = end - now()
         if remaining <= 0:
-            return None
+            return None, None
 
-        msg = bus.recv(timeout=min(0.1, remaining))
+        msg = recv(timeout=min(RECV_SLICE, remaining))
         if msg is None:
             continue
-        if msg.arbitration_id != res_id:
+        res_id = msg.arbitration_id
+        if res_id not in res_ids:  # bus filter aside: already answered ECUs
             continue
-        if len(msg.data) < 2:
+        data = msg.data
+        if len(data) < 2:
             continue
 
-        _log(context, f"RX {res_id:03X} " + " ".join(f"{b:02X}" for b in msg.data))
+        if trace:
+            _log_frame(context, f"RX {res_id:03X} " + data.hex(" ").upper())
 
-        pci_type = (msg.data[0] & 0xF0) >> 4
+        pci_type = (data[0] & 0xF0) >> 4
         if pci_type != 0x0:
             continue
 
-        ln = int(msg.data[0] & 0x0F)
-        if ln <= 0:
-            return b""
-        return bytes(msg.data[1:1 + min(ln, len(msg.data) - 1)])
+        ln = int(data[0] & 0x0F)
+        return res_id, memoryview(data)[1:1 + min(ln, len(data) - 1)]
 
 
 def check_all_ecus(
@@ -103,12 +151,10 @@ def check_all_ecus(
 ) -> Dict[str, Any]:
     bus = None
     details: Dict[str, bool] = {}
-    ecu_statuses: List[Dict[str, Any]] = []
 
     ecu_list = list(ecus) if ecus else list(DEFAULT_ECUS)
-    addr_map = dict(ECU_ADDRS)
-    if ecu_addrs:
-        addr_map.update(ecu_addrs)
+    # Overrides shadow the defaults without copying ECU_ADDRS on every call
+    addr_map = ChainMap(ecu_addrs, ECU_ADDRS) if ecu_addrs else ECU_ADDRS
 
     def _progress(p: int, m: str = ""):
         if progress:
@@ -122,38 +168,66 @@ def check_all_ecus(
         _progress(5, f"Opening CAN ({can_interface}@{bitrate})")
         bus = _open_bus(can_interface, int(bitrate))
 
-        total = max(1, len(ecu_list))
-        for idx, ecu_code in enumerate(ecu_list, start=1):
+        # Send every TesterPresent up front, then sort the replies by
+        # response ID: N ECUs share one timeout instead of waiting N times.
+        # ECUs still pending at the deadline stay inactive. ECUs sharing a
+        # response ID are credited one reply each, in send order.
+        pending: Dict[int, List[str]] = {}
+        requests: List[int] = []
+        for ecu_code in ecu_list:
+            details[ecu_code] = False
             addr = addr_map.get(ecu_code)
             if not addr:
-                details[ecu_code] = False
                 continue
-
-            req_id = int(addr["req"])
-            res_id = int(addr["res"])
-
-            _progress(int(10 + (idx * 80) / total), f"ECU {ecu_code}: TesterPresent")
-
+            pending.setdefault(int(addr["res"]), []).append(ecu_code)
+            requests.append(int(addr["req"]))
+
+        if pending:
+            # Let the kernel (SocketCAN) / python-can (PCAN) drop all other
+            # traffic before it reaches the receive loop.
+            try:
+                bus.set_filters([
+                    {"can_id": res_id, "can_mask": 0x7FF, "extended": False}
+                    for res_id in pending
+                ])
+            except Exception as e:
+                _log(context, f"Could not set CAN filter: {e}", "WARN")
+
+        for req_id in requests:
             _send_tester_present(bus, req_id, context=context)
-            payload = _recv_sf_payload(bus, res_id, float(per_ecu_timeout_sec), context=context)
 
-            if payload is None:
-                details[ecu_code] = False
-                continue
-
-            # 7F 3E NRC
-            if len(payload) >= 3 and payload[0] == 0x7F and payload[1] == 0x3E:
-                raise DiagnosticNegativeResponse(0x3E, int(payload[2]), "TesterPresent NRC")
-
-            details[ecu_code] = bool(len(payload) >= 1 and payload[0] == 0x7E)
-
-        for ecu_code, ok in details.items():
-            ecu_statuses.append({
+        waiting = len(requests)
+        total = max(1, waiting)
+        _progress(10, f"TesterPresent sent to {waiting} ECU(s)")
+
+        end = time.monotonic() + max(0.0, float(per_ecu_timeout_sec or 0.0))
+        while pending:
+            res_id, payload = _recv_sf_payload(bus, pending, end, context=context)
+            if res_id is None:
+                break
+            codes = pending[res_id]
+            ecu_code = codes.pop(0)
+            if not codes:
+                del pending[res_id]
+            waiting -= 1
+
+            # Positive reply is 7E (+ echoed sub-function, not checked); 7F 3E NRC
+            sid = payload[0] if payload else None
+            if sid == _TP_POSITIVE_SID:
+                details[ecu_code] = True
+            elif sid == UDS_NEGATIVE_RESPONSE and len(payload) >= 3 and payload[1] == UDS_TESTER_PRESENT:
+                raise DiagnosticNegativeResponse(UDS_TESTER_PRESENT, int(payload[2]), "TesterPresent NRC")
+            _progress(int(10 + ((total - waiting) * 80) / total), f"ECU {ecu_code}: responded")
+
+        ecu_statuses = [
+            {
                 "ecu_code": ecu_code,
                 "is_active": bool(ok),
                 "error_count": 0 if ok else 1,
                 "last_response": None,   # DB column is timestamp; keep None
-            })
+            }
+            for ecu_code, ok in details.items()
+        ]
 
         ecus_ok = 1 if (details and all(details.values())) else 0
         _progress(100, "ECU Active Check completed")
@@ -164,3 +238,36 @@ def check_all_ecus(
         if bus:
             try: bus.shutdown()
             except Exception: pass
+
+
+def check_ecu_active(
+    can_interface: str,
+    bitrate: int,
+    *,
+    ecu_code: str = "BMS",
+    per_ecu_timeout_sec: float = 1.0,
+    context=None,
+    progress=None,
+    **_,
+) -> Dict[str, Any]:
+    """
+    Single-ECU entry point, implemented on check_all_ecus().
+    Adds is_active (1/0) for output_limits and ecu_code for the service.
+    """
+    result = check_all_ecus(
+        can_interface,
+        bitrate,
+        ecus=[ecu_code],
+        per_ecu_timeout_sec=per_ecu_timeout_sec,
+        context=context,
+        progress=progress,
+    )
+    result["ecu_code"] = ecu_code
+    result["is_active"] = int(result["ecus_ok"])
+    return result
+
+
+__all__ = [
+    "check_ecu_active",
+    "check_all_ecus",
+]
@@ -26,6 +26,9 @@ web app can implement a "live preview" endpoint if you want it:
 
 - get_scan_frame_jpeg(scan_id: str) -> Optional[bytes]
 
+Preview frames are encoded with libjpeg-turbo (PyTurboJPEG) when installed,
+otherwise with cv2.imencode.
+
 NOTE: Your current Website_With_DB.py does not expose /api/scan/<id>/frame.
 If you want live preview on PC using backend OpenCV, add that endpoint.
 
@@ -45,7 +48,13 @@ ENV
 - NIRIX_SCAN_PREVIEW_WIDTH (default "640")      # resize preview frames
 - NIRIX_SCAN_PREVIEW_QUALITY (default "75")     # JPEG quality 1..100
 - NIRIX_SCAN_PREVIEW_MAX_FPS (default "8")      # limit preview encode frequency
+- NIRIX_SCAN_DECODE_WIDTH (default "960")       # downscale frames before decoding (0 = off)
 - NIRIX_SCAN_CAP_BACKEND (optional; e.g. "DSHOW", "MSMF", "V4L2")
+- NIRIX_SCAN_CAP_W / NIRIX_SCAN_CAP_H (default "1280" / "720"; 0 = driver default)
+- NIRIX_SCAN_CAP_FOURCC (default "MJPG"; empty = driver default)
+- NIRIX_SCAN_CV_FALLBACK (default "true")       # OpenCV detectors after pyzbar misses
+- NIRIX_SCAN_USE_OCL (default "false")          # OpenCL (UMat) resize/grayscale if available
+- NIRIX_SCAN_CV_THREADS (default: half the CPUs) # OpenCV internal thread pool size
 """
 
 from __future__ import annotations
@@ -53,12 +62,16 @@ from __future__ import annotations
 import os
 import time
 import uuid
+import logging
 import threading
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any
+from typing import Optional, Any, Tuple
 
 import cv2
 
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # CONFIG
@@ -71,6 +84,28 @@ PREVIEW_ENABLED = os.getenv("NIRIX_SCAN_PREVIEW_ENABLED", "true").lower() in ("1
 PREVIEW_WIDTH = int(os.getenv("NIRIX_SCAN_PREVIEW_WIDTH", "640"))
 PREVIEW_QUALITY = int(os.getenv("NIRIX_SCAN_PREVIEW_QUALITY", "75"))
 PREVIEW_MAX_FPS = float(os.getenv("NIRIX_SCAN_PREVIEW_MAX_FPS", "8"))
+_JPEG_QUALITY = max(10, min(95, PREVIEW_QUALITY))
+_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), _JPEG_QUALITY]
+# Skip preview encoding unless get_scan_frame_jpeg() was polled this recently
+PREVIEW_IDLE_NS = 2_000_000_000
+
+DECODE_WIDTH = int(os.getenv("NIRIX_SCAN_DECODE_WIDTH", "960"))
+
+CAP_W = int(os.getenv("NIRIX_SCAN_CAP_W", "1280"))
+CAP_H = int(os.getenv("NIRIX_SCAN_CAP_H", "720"))
+CAP_FOURCC = (os.getenv("NIRIX_SCAN_CAP_FOURCC", "MJPG") or "").strip().upper()
+
+CV_FALLBACK = os.getenv("NIRIX_SCAN_CV_FALLBACK", "true").lower() in ("1", "true", "yes")
+USE_OCL = os.getenv("NIRIX_SCAN_USE_OCL", "false").lower() in ("1", "true", "yes")
+CV_THREADS = int(os.getenv("NIRIX_SCAN_CV_THREADS", "0") or 0) or max(1, (os.cpu_count() or 2) // 2)
+
+# SIMD paths on, and a sized thread pool for OpenCV's internal parallel loops
+try:
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(CV_THREADS)
+    logger.info(f"[SCANNER] OpenCV threads={cv2.getNumThreads()} optimized={cv2.useOptimized()}")
+except Exception:
+    pass
 
 # Enforce single camera access process-wide
 _CAMERA_LOCK = threading.Lock()
@@ -90,6 +125,32 @@ def _cv_cap_backend() -> int:
     return mapping.get(name, 0)
 
 
+# Resolved once; the env var is read at import like the other settings
+_CV_CAP_BACKEND = _cv_cap_backend()
+
+
+def _configure_capture(cap) -> None:
+    """
+    Request MJPG at a fixed resolution with a 1-frame driver queue.
+    MJPG needs far less USB bandwidth than YUY2 and BUFFERSIZE=1 avoids
+    stale frames. Best-effort: backends silently ignore unsupported props.
+    """
+    props = []
+    if len(CAP_FOURCC) == 4:
+        props.append((cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CAP_FOURCC)))
+    if CAP_W > 0 and CAP_H > 0:
+        props.append((cv2.CAP_PROP_FRAME_WIDTH, CAP_W))
+        props.append((cv2.CAP_PROP_FRAME_HEIGHT, CAP_H))
+    props.append((cv2.CAP_PROP_BUFFERSIZE, 1))
+    props.append((cv2.CAP_PROP_FPS, 30))
+
+    for prop, value in props:
+        try:
+            cap.set(prop, value)
+        except Exception:
+            pass
+
+
 # Prefer OpenCV barcode module if available (opencv-contrib-python)
 _BARCODE_DETECTOR = None
 try:
@@ -101,8 +162,35 @@ try:
 except Exception:
     _BARCODE_DETECTOR = None
 
+# Detectors are module singletons and need no lock: the camera lock means
+# only one scan worker decodes at a time.
 _QR_DETECTOR = cv2.QRCodeDetector()
 
+# Prefer ZBar (pyzbar) if available: QR + 1D symbologies in one grayscale pass
+_ZBAR_DECODE = None
+try:
+    from pyzbar.pyzbar import decode as _ZBAR_DECODE  # type: ignore
+except Exception:
+    _ZBAR_DECODE = None
+
+# Optional OpenCL (T-API) offload of the per-frame resize/grayscale
+_OCL = False
+if USE_OCL:
+    try:
+        if cv2.ocl.haveOpenCL():
+            cv2.ocl.setUseOpenCL(True)
+            _OCL = bool(cv2.ocl.useOpenCL())
+    except Exception:
+        _OCL = False
+
+# Prefer libjpeg-turbo (SIMD) for preview JPEG encoding if available (PyTurboJPEG)
+_TJ = None
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420  # type: ignore
+    _TJ = TurboJPEG()
+except Exception:
+    _TJ = None
+
 
 # =============================================================================
 # DATA MODEL
@@ -119,9 +207,13 @@ class ScanSession:
 
     cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
 
+    # Frames skipped to keep decoding on the newest image (observability)
+    dropped_frames: int = 0
+
     # Optional preview support (latest JPEG frame)
     last_frame_jpeg: Optional[bytes] = None
     last_frame_at: Optional[float] = None
+    last_preview_request_ns: int = 0  # time.monotonic_ns()
 
     # Internal lock for safe updates
     _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
@@ -133,6 +225,7 @@ class ScanSession:
                 self.error = error
 
     def set_value_found(self, value: str):
+        # value before status: lock-free pollers that see "found" also see value
         with self._lock:
             self.value = value
             self.status = "found"
@@ -143,7 +236,8 @@ class ScanSession:
             self.last_frame_at = time.time()
 
 
-_SCANS: Dict[str, ScanSession] = {}
+# Insertion order == creation order, so expired sessions sit at the front
+_SCANS: "OrderedDict[str, ScanSession]" = OrderedDict()
 _SCANS_LOCK = threading.Lock()
 
 
@@ -151,26 +245,120 @@ _SCANS_LOCK = threading.Lock()
 # HELPERS
 # =============================================================================
 
+# A grab() that returns faster than this came from the driver's queue
+# (stale); one that had to wait is a fresh frame.
+_FRESH_GRAB_NS = 5_000_000
+_MAX_GRABS = 4
+
+
+def _grab_latest(cap) -> Tuple[bool, int]:
+    """
+    Grab queued frames until one had to be waited for, so only the newest
+    frame is retrieved/decoded. grab() skips the decode, unlike read().
+    Returns (ok, dropped).
+    """
+    grabbed = 0
+    for _ in range(_MAX_GRABS):
+        t0 = time.monotonic_ns()
+        if not cap.grab():
+            return False, max(0, grabbed - 1)
+        grabbed += 1
+        if time.monotonic_ns() - t0 >= _FRESH_GRAB_NS:
+            break
+    return True, grabbed - 1
+
+
+def _decode_view(frame, buf=None):
+    """
+    Downscale frame to DECODE_WIDTH for the detectors (their cost scales with
+    pixel count). Reuses `buf` as the resize target while the frame size is
+    unchanged. Returns (img, buf); img is the frame itself if no resize needed.
+    """
+    h, w = frame.shape[:2]
+    if DECODE_WIDTH <= 0 or w <= DECODE_WIDTH:
+        return frame, buf
+    dh = int(h * DECODE_WIDTH / float(w))
+    if buf is None or buf.shape[:2] != (dh, DECODE_WIDTH):
+        buf = None
+    buf = cv2.resize(frame, (DECODE_WIDTH, dh), dst=buf, interpolation=cv2.INTER_AREA)
+    return buf, buf
+
+
+def _post_vin(s: str) -> str:
+    return s.upper().replace(" ", "")
+
+
+def _post_hex(s: str) -> str:
+    s = s.upper()
+    if s.startswith("0X"):
+        s = s[2:]
+    return s.replace(" ", "")
+
+
+def _post_text(s: str) -> str:
+    return s
+
+
+_POSTPROC = {
+    "vin": _post_vin,
+    "hex": _post_hex,
+}
+
+
+def _normalize_kind(kind: Optional[str]) -> str:
+    """Lower-case/strip `kind`; already-normalised values (the API's) pass through."""
+    if kind in _POSTPROC or kind == "text":
+        return kind
+    return (kind or "text").strip().lower()
+
+
 def _postprocess(value: str, kind: str) -> str:
     """
-    Post-process decoded text based on `kind`:
+    Post-process decoded text based on `kind` (already normalised by start_scan):
       - "vin": uppercase, strip spaces
       - "hex": uppercase, strip 0x prefix and spaces
       - default: strip
+    Each handler receives the already-stripped value.
     """
-    s = (value or "").strip()
-    kind = (kind or "text").strip().lower()
-
-    if kind == "vin":
-        s = s.upper().replace(" ", "")
-    elif kind == "hex":
-        s = s.strip().upper()
-        if s.startswith("0X"):
-            s = s[2:]
-        s = s.replace(" ", "")
-    else:
-        s = s.strip()
-    return s
+    return _POSTPROC.get(kind, _post_text)((value or "").strip())
+
+
+def _gray_view(frame, buf=None):
+    """Grayscale copy of frame, reusing `buf` while the size is unchanged. Returns (gray, buf)."""
+    if frame.ndim == 2:
+        return frame, buf
+    if buf is None or buf.shape != frame.shape[:2]:
+        buf = None
+    buf = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=buf)
+    return buf, buf
+
+
+def _ocl_views(frame, want_gray: bool):
+    """
+    OpenCL variant of _decode_view/_gray_view: resize and grayscale on the
+    device via UMat, download once for the (CPU-only) detectors.
+    Returns (decode_img, gray or None).
+    """
+    umat = cv2.UMat(frame)
+    h, w = frame.shape[:2]
+    if DECODE_WIDTH > 0 and w > DECODE_WIDTH:
+        dh = int(h * DECODE_WIDTH / float(w))
+        umat = cv2.resize(umat, (DECODE_WIDTH, dh), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(umat, cv2.COLOR_BGR2GRAY).get() if want_gray else None
+    return umat.get(), gray
+
+
+def _try_decode_zbar(gray) -> Optional[str]:
+    """Decode using ZBar (pyzbar, if available) on a grayscale image."""
+    if _ZBAR_DECODE is None:
+        return None
+    try:
+        for sym in _ZBAR_DECODE(gray):
+            if sym.data:
+                return sym.data.decode("utf-8", errors="replace")
+    except Exception:
+        return None
+    return None
 
 
 def _try_decode_barcode(frame) -> Optional[str]:
@@ -216,25 +404,35 @@ def _try_decode_qr(frame) -> Optional[str]:
     return None
 
 
-def _decode_frame(frame) -> Optional[str]:
+def _decode_frame(frame, gray=None) -> Optional[str]:
     """
     Decode a single frame using:
-      1) OpenCV barcode detector (if available)
-      2) OpenCV QRCodeDetector (always available)
+      1) ZBar on `gray` (if pyzbar available; gray computed when not given)
+      2) OpenCV barcode detector (if available)
+      3) OpenCV QRCodeDetector (always available)
+    Steps 2/3 are skipped after a ZBar miss unless CV_FALLBACK is set.
     """
+    if _ZBAR_DECODE is not None:
+        if gray is None:
+            gray, _ = _gray_view(frame)
+        v = _try_decode_zbar(gray)
+        if v or not CV_FALLBACK:
+            return v
+
     v = _try_decode_barcode(frame)
     if v:
         return v
     return _try_decode_qr(frame)
 
 
-def _encode_preview_jpeg(frame) -> Optional[bytes]:
+def _encode_preview_jpeg(frame, buf=None):
     """
     Encode frame as JPEG for optional preview.
-    Resizes for bandwidth/CPU control.
+    Resizes for bandwidth/CPU control into `buf` (reused while the size is
+    unchanged); uses TurboJPEG when available. Returns (jpg or None, buf).
     """
     if frame is None:
-        return None
+        return None, buf
 
     try:
         img = frame
@@ -245,15 +443,24 @@ def _encode_preview_jpeg(frame) -> Optional[bytes]:
                 scale = PREVIEW_WIDTH / float(w)
                 new_w = PREVIEW_WIDTH
                 new_h = int(h * scale)
-                img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+                if buf is None or buf.shape[:2] != (new_h, new_w):
+                    buf = None
+                buf = cv2.resize(img, (new_w, new_h), dst=buf, interpolation=cv2.INTER_AREA)
+                img = buf
+
+        if _TJ is not None:
+            try:
+                return _TJ.encode(img, quality=_JPEG_QUALITY, pixel_format=TJPF_BGR,
+                                  jpeg_subsample=TJSAMP_420), buf
+            except Exception:
+                pass  # fall back to OpenCV
 
-        quality = max(10, min(95, int(PREVIEW_QUALITY)))
-        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        ok, enc = cv2.imencode(".jpg", img, _JPEG_PARAMS)
         if not ok:
-            return None
-        return buf.tobytes()
+            return None, buf
+        return enc.tobytes(), buf
     except Exception:
-        return None
+        return None, buf
 
 
 # =============================================================================
@@ -271,6 +478,7 @@ def start_scan(kind: str = "text", timeout_sec: Optional[int] = None) -> ScanSes
     Returns:
         ScanSession with a unique scan_id.
     """
+    kind = _normalize_kind(kind)
     scan_id = f"scan_{uuid.uuid4().hex[:10]}"
     session = ScanSession(scan_id=scan_id)
 
@@ -290,10 +498,19 @@ def start_scan(kind: str = "text", timeout_sec: Optional[int] = None) -> ScanSes
             return
 
         cap = None
+        cap_thread = None
+        stop = threading.Event()
+        mbox: list = [None]  # 1-slot latest-frame mailbox (overwrite-on-produce)
+        mbox_cv = threading.Condition()
+        capture_error: list = [None]
+        decoder_waiting: list = [False]  # set by the decoder while blocked on mbox_cv
+        # [capture thread exited, worker gave up waiting for it]; guarded by
+        # mbox_cv. If the worker gives up (capture stuck in grab()), the
+        # capture thread releases the camera and _CAMERA_LOCK when it returns.
+        cap_handoff: list = [False, False]
         try:
-            backend = _cv_cap_backend()
-            if backend:
-                cap = cv2.VideoCapture(CAM_INDEX, backend)
+            if _CV_CAP_BACKEND:
+                cap = cv2.VideoCapture(CAM_INDEX, _CV_CAP_BACKEND)
             else:
                 cap = cv2.VideoCapture(CAM_INDEX)
 
@@ -301,32 +518,112 @@ def start_scan(kind: str = "text", timeout_sec: Optional[int] = None) -> ScanSes
                 session.set_status("error", error=f"Cannot open camera index {CAM_INDEX}")
                 return
 
-            end = time.time() + tsec
-            last_preview_emit = 0.0
-            preview_min_interval = 1.0 / max(1.0, float(PREVIEW_MAX_FPS))
-
-            while time.time() < end and not session.cancel_event.is_set():
-                ok, frame = cap.read()
-                if not ok or frame is None:
-                    time.sleep(0.05)
+            _configure_capture(cap)
+
+            end_ns = time.monotonic_ns() + tsec * 1_000_000_000
+            preview_interval_ns = int(1e9 / max(1.0, float(PREVIEW_MAX_FPS)))
+
+            def capture():
+                # Keeps grabbing at camera rate while the decoder runs, but only
+                # retrieve()s (decodes the camera image) when the decoder is
+                # waiting for a frame or a preview frame is due.
+                last_preview_ns = 0
+                preview_buf = None
+                # retrieve() targets, reused while the frame size is unchanged.
+                # decode_frame_buf is only written while the decoder is idle.
+                decode_frame_buf = None
+                preview_frame_buf = None
+                try:
+                    while not stop.is_set():
+                        ok, dropped = _grab_latest(cap)
+                        if dropped:
+                            session.dropped_frames += dropped
+                        if not ok:
+                            stop.wait(0.05)
+                            continue
+
+                        now_ns = time.monotonic_ns()
+                        preview_due = (PREVIEW_ENABLED
+                                       and now_ns - last_preview_ns >= preview_interval_ns
+                                       and now_ns - session.last_preview_request_ns < PREVIEW_IDLE_NS)
+                        hand_off = decoder_waiting[0]
+                        if not hand_off and not preview_due:
+                            session.dropped_frames += 1
+                            continue
+
+                        target = decode_frame_buf if hand_off else preview_frame_buf
+                        ok, frame = cap.retrieve(target) if target is not None else cap.retrieve()
+                        if not ok or frame is None:
+                            stop.wait(0.05)
+                            continue
+
+                        # Optional preview capture (only while someone is polling it)
+                        if preview_due:
+                            jpg, preview_buf = _encode_preview_jpeg(frame, preview_buf)
+                            if jpg:
+                                session.set_preview_frame(jpg)
+                            last_preview_ns = now_ns
+
+                        if not hand_off:
+                            preview_frame_buf = frame
+                        else:
+                            decode_frame_buf = frame
+                            with mbox_cv:
+                                decoder_waiting[0] = False  # busy until it waits again
+                                if mbox[0] is not None:
+                                    session.dropped_frames += 1
+                                mbox[0] = frame
+                                mbox_cv.notify()
+                except Exception as e:
+                    capture_error[0] = e
+                finally:
+                    with mbox_cv:
+                        stop.set()
+                        mbox_cv.notify()
+                        cap_handoff[0] = True
+                        orphaned = cap_handoff[1]
+                    if orphaned:
+                        try:
+                            cap.release()
+                        finally:
+                            _CAMERA_LOCK.release()
+
+            cap_thread = threading.Thread(target=capture, daemon=True)
+            cap_thread.start()
+
+            decode_buf = None
+            gray_buf = None
+
+            while not session.cancel_event.is_set():
+                remaining_ns = end_ns - time.monotonic_ns()
+                if remaining_ns <= 0:
+                    break
+                with mbox_cv:
+                    if mbox[0] is None and not stop.is_set():
+                        decoder_waiting[0] = True
+                        mbox_cv.wait(timeout=min(0.05, remaining_ns / 1e9))
+                        decoder_waiting[0] = False
+                    frame, mbox[0] = mbox[0], None
+                if frame is None:
+                    if stop.is_set():
+                        break
                     continue
 
-                # Optional preview capture
-                if PREVIEW_ENABLED:
-                    now = time.time()
-                    if (now - last_preview_emit) >= preview_min_interval:
-                        jpg = _encode_preview_jpeg(frame)
-                        if jpg:
-                            session.set_preview_frame(jpg)
-                        last_preview_emit = now
-
-                # Decode
-                val = _decode_frame(frame)
+                # Decode (on the downscaled view; preview keeps full-res)
+                gray = None
+                if _OCL:
+                    decode_img, gray = _ocl_views(frame, _ZBAR_DECODE is not None)
+                else:
+                    decode_img, decode_buf = _decode_view(frame, decode_buf)
+                    if _ZBAR_DECODE is not None:
+                        gray, gray_buf = _gray_view(decode_img, gray_buf)
+                val = _decode_frame(decode_img, gray)
                 if val:
                     session.set_value_found(_postprocess(val, kind))
                     return
 
-                time.sleep(0.02)
+            if capture_error[0] is not None:
+                raise capture_error[0]
 
             if session.cancel_event.is_set():
                 session.set_status("cancelled")
@@ -337,20 +634,28 @@ def start_scan(kind: str = "text", timeout_sec: Optional[int] = None) -> ScanSes
             session.set_status("error", error=str(e))
 
         finally:
-            try:
-                if cap is not None:
-                    cap.release()
-            finally:
-                _CAMERA_LOCK.release()
+            stop.set()
+            if cap_thread is not None:
+                cap_thread.join(timeout=2.0)
+                with mbox_cv:
+                    if not cap_handoff[0]:
+                        # Still blocked in native grab(): releasing now would
+                        # free the capture under it. Leave cleanup to it.
+                        cap_handoff[1] = True
+            if not cap_handoff[1]:
+                try:
+                    if cap is not None:
+                        cap.release()
+                finally:
+                    _CAMERA_LOCK.release()
 
     threading.Thread(target=worker, daemon=True).start()
     return session
 
 
 def get_scan(scan_id: str) -> Optional[ScanSession]:
-    """Get scan session state by ID."""
-    with _SCANS_LOCK:
-        return _SCANS.get(scan_id)
+    """Get scan session state by ID (lock-free: a single dict lookup is atomic)."""
+    return _SCANS.get(scan_id)
 
 
 def get_scan_frame_jpeg(scan_id: str) -> Optional[bytes]:
@@ -361,8 +666,9 @@ def get_scan_frame_jpeg(scan_id: str) -> Optional[bytes]:
     s = get_scan(scan_id)
     if not s:
         return None
-    with s._lock:
-        return s.last_frame_jpeg
+    s.last_preview_request_ns = time.monotonic_ns()
+    # Single attribute load; the worker replaces the bytes object, never mutates it
+    return s.last_frame_jpeg
 
 
 def cancel_scan(scan_id: str) -> bool:
@@ -377,13 +683,16 @@ def cancel_scan(scan_id: str) -> bool:
 def cleanup_scans(max_age_sec: int = 300) -> int:
     """
     Remove old scan sessions from memory.
+    Pops from the oldest end only, so live sessions are never walked.
     """
     now = time.time()
     removed = 0
     with _SCANS_LOCK:
-        to_del = [sid for sid, s in _SCANS.items() if (now - s.created_at) > max_age_sec]
-        for sid in to_del:
-            _SCANS.pop(sid, None)
+        while _SCANS:
+            s = next(iter(_SCANS.values()))
+            if (now - s.created_at) <= max_age_sec:
+                break
+            _SCANS.popitem(last=False)
             removed += 1
     return removed
 
@@ -23,6 +23,15 @@ logging.getLogger("can").setLevel(logging.ERROR)
 TESTER_ID = 0x7F0
 ECU_RESPONSE_ID = 0x7F1
 
+# Byte -> printable ASCII ('?' for anything outside 0x20..0x7E), for bytes.translate
+_PRINTABLE_ASCII = bytes(b if 32 <= b <= 126 else 0x3F for b in range(256))
+
+# Only the ECU's responses reach us (kernel-filtered on SocketCAN)
+_RX_FILTERS = [{"can_id": ECU_RESPONSE_ID, "can_mask": 0x7FF, "extended": False}]
+
+# Flow Control: ContinueToSend, BS=0, STmin=0
+_FC_CTS = b"\x30\x00\x00"
+
 
 def _log_tx(msg: can.Message, context=None):
     data = " ".join(f"{b:02X}" for b in msg.data)
@@ -43,114 +52,124 @@ def _log_rx(msg: can.Message, context=None):
             print(line)
 
 
+def _sanitize_ascii_upper(data: bytes) -> str:
+    """Decode DID bytes as printable ASCII in one C-level pass (non-printables -> '?')."""
+    return bytes(data).translate(_PRINTABLE_ASCII).decode("ascii").strip().upper()
+
+
 def _open_bus(can_interface: str, bitrate: int) -> can.Bus:
     iface = can_interface.strip()
     if iface.upper().startswith("PCAN"):
-        return can.Bus(interface="pcan", channel=iface, bitrate=bitrate)
-    if iface.lower().startswith("can"):
-        return can.Bus(interface="socketcan", channel=iface, bitrate=bitrate)
-    raise ValueError(f"Unsupported CAN interface: {iface}")
+        bus = can.Bus(interface="pcan", channel=iface, bitrate=bitrate)
+    elif iface.lower().startswith("can"):
+        bus = can.Bus(interface="socketcan", channel=iface, bitrate=bitrate)
+    else:
+        raise ValueError(f"Unsupported CAN interface: {iface}")
+    try:
+        bus.set_filters(_RX_FILTERS)
+    except Exception:
+        pass  # _receive_single_can_frame still checks the ID
+    return bus
 
 
-def _send_can_frame(bus: can.Bus, arbitration_id: int, data: list, context=None):
-    padded_data = data[:]
-    while len(padded_data) < 8:
-        padded_data.append(0x00)
-    msg = can.Message(arbitration_id=arbitration_id, data=bytearray(padded_data[:8]), is_extended_id=False)
+def _send_can_frame(bus: can.Bus, arbitration_id: int, data: bytes, context=None):
+    msg = can.Message(arbitration_id=arbitration_id, data=data[:8].ljust(8, b"\x00"), is_extended_id=False)
     _log_tx(msg, context)
     bus.send(msg)
 
 
 def _receive_single_can_frame(bus: can.Bus, response_id: int, timeout: float = 0.5, context=None) -> Optional[can.Message]:
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        msg = bus.recv(timeout=timeout - (time.time() - start_time))
+    end_ns = time.monotonic_ns() + int(timeout * 1e9)
+    while True:
+        remaining_ns = end_ns - time.monotonic_ns()
+        if remaining_ns <= 0:
+            break
+        msg = bus.recv(timeout=remaining_ns / 1e9)
         if msg and msg.arbitration_id == response_id:
             _log_rx(msg, context)
             return msg
     return None
 
 
-def _receive_isotp_response(bus: can.Bus, response_id: int, timeout: float = 5.0, context=None) -> Optional[list]:
-    start_time = time.time()
-    full_response_data: list[int] = []
-    expect_consecutive_frames = False
-    seq_number_expected = 1
+def _receive_isotp_response(bus: can.Bus, response_id: int, timeout: float = 5.0, context=None) -> Optional[bytes]:
+    end_ns = time.monotonic_ns() + int(timeout * 1e9)
+    out: Optional[bytearray] = None  # pre-sized from the First Frame length
     total_uds_length = 0
+    offset = 0
+    seq_number_expected = 1
 
-    while time.time() - start_time < timeout:
-        msg = _receive_single_can_frame(bus, response_id, timeout=0.5, context=context)
+    while True:
+        remaining_ns = end_ns - time.monotonic_ns()
+        if remaining_ns <= 0:
+            break
+        msg = _receive_single_can_frame(bus, response_id, timeout=min(0.5, remaining_ns / 1e9), context=context)
         if not msg:
             continue
 
-        pci_type = (msg.data[0] & 0xF0) >> 4
+        data = msg.data
+        pci_type = data[0] >> 4
 
         if pci_type == 0x0:  # Single Frame
-            uds_length = msg.data[0] & 0x0F
-            full_response_data = list(msg.data[1:1 + uds_length])
-            break
+            uds_length = data[0] & 0x0F
+            return bytes(data[1:1 + uds_length]) or None
 
         elif pci_type == 0x1:  # First Frame
-            total_uds_length = ((msg.data[0] & 0x0F) << 8) + msg.data[1]
-            full_response_data = list(msg.data[2:])
-            expect_consecutive_frames = True
+            total_uds_length = ((data[0] & 0x0F) << 8) | data[1]
+            out = bytearray(total_uds_length)
+            offset = min(6, total_uds_length)
+            out[:offset] = data[2:2 + offset]
             seq_number_expected = 1
 
             # Flow Control (CTS)
-            fc_frame = [0x30, 0x00, 0x00] + [0x00] * 5
             time.sleep(0.01)
-            _send_can_frame(bus, TESTER_ID, fc_frame, context)
+            _send_can_frame(bus, TESTER_ID, _FC_CTS, context)
             continue
 
-        elif expect_consecutive_frames and pci_type == 0x2:  # Consecutive Frame
-            seq_number = msg.data[0] & 0x0F
+        elif out is not None and pci_type == 0x2:  # Consecutive Frame
+            seq_number = data[0] & 0x0F
             if seq_number != seq_number_expected:
                 return None
 
-            full_response_data.extend(msg.data[1:])
-            seq_number_expected = (seq_number_expected + 1) % 16
+            n = min(7, total_uds_length - offset)
+            out[offset:offset + n] = data[1:1 + n]
+            offset += n
+            seq_number_expected = (seq_number_expected + 1) & 0x0F
 
-            if len(full_response_data) >= total_uds_length:
-                full_response_data = full_response_data[:total_uds_length]
-                break
+            if offset >= total_uds_length:
+                return bytes(out)
 
-    return full_response_data or None
+    return bytes(out[:offset]) if out is not None and offset else None
 
 
-def _send_isotp_request(bus: can.Bus, arbitration_id: int, data: list, context=None) -> bool:
+def _send_isotp_request(bus: can.Bus, arbitration_id: int, data: bytes, context=None) -> bool:
     total_len = len(data)
     if total_len <= 7:
-        sf = [total_len] + data + [0x00] * (7 - total_len)
-        _send_can_frame(bus, arbitration_id, sf, context)
+        _send_can_frame(bus, arbitration_id, bytes((total_len,)) + data, context)
         return True
 
-    ff_data = [0x10 | ((total_len >> 8) & 0x0F), total_len & 0xFF] + data[:6]
+    ff_data = bytes((0x10 | ((total_len >> 8) & 0x0F), total_len & 0xFF)) + data[:6]
     _send_can_frame(bus, arbitration_id, ff_data, context)
 
     fc_msg = _receive_single_can_frame(bus, ECU_RESPONSE_ID, timeout=1.0, context=context)
     if not fc_msg or ((fc_msg.data[0] & 0xF0) >> 4) != 0x3:
         return False
 
-    remaining_data = data[6:]
     seq = 1
-    while remaining_data:
-        cf_data_len = min(7, len(remaining_data))
-        cf = [0x20 | (seq % 16)] + remaining_data[:cf_data_len]
+    for offset in range(6, total_len, 7):
+        cf = bytes((0x20 | (seq & 0x0F),)) + data[offset:offset + 7]
         _send_can_frame(bus, arbitration_id, cf, context)
-        remaining_data = remaining_data[cf_data_len:]
         seq += 1
         time.sleep(0.01)
 
     return True
 
 
-def _send_uds_request(bus: can.Bus, sid: int, sub_payload: list, expected_positive_sid: int,
-                      timeout: float = 5.0, context=None) -> Optional[list]:
-    uds_payload = [sid] + sub_payload
+def _send_uds_request(bus: can.Bus, sid: int, sub_payload: bytes, expected_positive_sid: int,
+                      timeout: float = 5.0, context=None) -> Optional[bytes]:
+    uds_payload = bytes((sid,)) + sub_payload
 
     if len(uds_payload) <= 7:
-        sf = [len(uds_payload)] + uds_payload + [0x00] * (7 - len(uds_payload))
-        _send_can_frame(bus, TESTER_ID, sf, context)
+        _send_can_frame(bus, TESTER_ID, bytes((len(uds_payload),)) + uds_payload, context)
     else:
         if not _send_isotp_request(bus, TESTER_ID, uds_payload, context):
             return None
@@ -162,7 +181,7 @@ def _send_uds_request(bus: can.Bus, sid: int, sub_payload: list, expected_positi
 
 
 def _extended_diagnostic_session(bus: can.Bus, context=None) -> bool:
-    response = _send_uds_request(bus, 0x10, [0x03], 0x50, timeout=2.0, context=context)
+    response = _send_uds_request(bus, 0x10, b"\x03", 0x50, timeout=2.0, context=context)
     return bool(response and len(response) >= 2 and response[1] == 0x03)
 
 
@@ -204,17 +223,17 @@ def read_vin(
         response = _send_uds_request(
             bus,
             sid=0x22,
-            sub_payload=[0xF1, 0x90],
+            sub_payload=b"\xF1\x90",
             expected_positive_sid=0x62,
             timeout=timeout,
             context=context,
         )
 
-        raw["uds_response"] = response
+        raw["uds_response"] = list(response) if response is not None else None
 
         if response and len(response) >= 3 and response[1] == 0xF1 and response[2] == 0x90:
             vin_bytes = response[3:]
-            vin_str = "".join(chr(b) if 32 <= b <= 126 else "?" for b in vin_bytes).strip().upper()
+            vin_str = _sanitize_ascii_upper(vin_bytes)
 
             if context:
                 context.log(f"VIN read: {vin_str}")